@@ -7,17 +7,39 @@ incluyendo productos más vendidos, problemas de entrega y tasas de éxito por c
 
 """
 
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Iterator
 
+import matplotlib
 import matplotlib.pyplot as plt
+import numpy as np
 import pandas as pd
 import seaborn as sns
 
+# Backend no interactivo: la figura solo se guarda en disco y puede
+# serializarse desde un hilo secundario
+matplotlib.use("Agg")
+
+# Columnas de texto repetitivas que se leen del CSV como categorías
+_CSV_DTYPES = {
+    "ciudad": "category",
+    "producto": "category",
+    "estado_entrega": "category",
+    "cliente_id": "category",
+}
+
 
 def load_csv_into_df(file_name: str) -> pd.DataFrame:
     """
     Carga un archivo CSV en un DataFrame de pandas.
 
+    Utiliza el parser multihilo de PyArrow para leer el archivo e interpreta
+    las columnas de texto repetitivas como categorías ('fecha' se convierte
+    en normalize_dataframe).
+    La primera lectura guarda una copia en Parquet junto al CSV, que se
+    reutiliza mientras sea más reciente que el CSV.
+
     Args:
         file_name (str): Nombre del archivo CSV a cargar
 
@@ -27,7 +49,62 @@ def load_csv_into_df(file_name: str) -> pd.DataFrame:
     Ejemplo:
         >>> df = load_csv_into_df("ventas_pedidos_500.csv")
     """
-    return pd.read_csv(Path.cwd() / file_name)
+    csv_path = Path.cwd() / file_name
+    parquet_path = csv_path.with_suffix(".parquet")
+
+    # Reutilizar la copia en Parquet si está al día con el CSV
+    if (
+        parquet_path.exists()
+        and parquet_path.stat().st_mtime >= csv_path.stat().st_mtime
+    ):
+        return pd.read_parquet(parquet_path)
+
+    df = pd.read_csv(csv_path, engine="pyarrow", dtype=_CSV_DTYPES)
+    df.to_parquet(parquet_path, index=False)
+
+    return df
+
+
+def load_csv_in_chunks(
+    file_name: str, chunksize: int = 50_000
+) -> Iterator[pd.DataFrame]:
+    """
+    Carga un archivo CSV por bloques para procesarlo con memoria acotada.
+
+    Cada bloque se lee con las mismas conversiones de tipos que
+    load_csv_into_df (columnas de texto repetitivas como categorías).
+
+    Args:
+        file_name (str): Nombre del archivo CSV a cargar
+        chunksize (int): Número máximo de filas por bloque
+
+    Yields:
+        pd.DataFrame: DataFrame con un bloque de filas del CSV
+
+    Ejemplo:
+        >>> for chunk in load_csv_in_chunks("ventas_pedidos_500.csv"):
+        ...     print(len(chunk))
+    """
+    with pd.read_csv(
+        Path.cwd() / file_name, chunksize=chunksize, dtype=_CSV_DTYPES
+    ) as reader:
+        yield from reader
+
+
+def normalized_cache_path(file_name: str) -> Path:
+    """
+    Retorna la ruta de la copia normalizada en Parquet asociada a un CSV.
+
+    orchestrate_analysis guarda allí el DataFrame ya normalizado para que la
+    migración a la base de datos pueda reutilizarlo sin volver a leer el CSV.
+
+    Args:
+        file_name (str): Nombre del archivo CSV de origen
+
+    Returns:
+        Path: Ruta del archivo Parquet dentro del directorio reportes/
+    """
+    return Path.cwd() / "reportes" / f"_normalized_{Path(file_name).stem}.parquet"
 
 
 def normalize_dataframe(df: pd.DataFrame) -> pd.DataFrame:
@@ -35,9 +112,9 @@ def normalize_dataframe(df: pd.DataFrame) -> pd.DataFrame:
     Normaliza y limpia el DataFrame de ventas.
 
     Realiza las siguientes transformaciones:
-    - Convierte el campo 'fecha' a tipo datetime
+    - Convierte 'fecha' a datetime (los valores vacíos quedan como NaT)
     - Calcula la fecha de entrega basada en días de entrega
-    - Calcula el ingreso total (cantidad × precio unitario)
+    - Convierte ciudad, producto, estado_entrega y cliente_id a tipo categórico
     - Elimina filas con valores faltantes
 
     Args:
@@ -55,24 +132,41 @@ def normalize_dataframe(df: pd.DataFrame) -> pd.DataFrame:
     # Convertir campos de texto a campos de tipo fecha
     df["fecha"] = pd.to_datetime(df["fecha"])
 
-    # Calcular fecha de entrega
-    df["fecha_entrega"] = df["fecha"] + pd.to_timedelta(
-        df["tiempo_entrega_dias"], unit="D"
+    # Calcular fecha de entrega (los días faltantes se convierten en NaT)
+    dias_entrega = df["tiempo_entrega_dias"].to_numpy("float64")
+    df["fecha_entrega"] = df["fecha"].to_numpy() + dias_entrega.astype("timedelta64[D]")
+
+    # Codificar columnas de texto repetitivas como categorías
+    for col in ("ciudad", "producto", "estado_entrega", "cliente_id"):
+        df[col] = df[col].astype("category")
+
+    # Retornar dataset con datos limpios (sin valores nulos en las columnas que
+    # usan los análisis y la migración; fecha_entrega se deriva de fecha y
+    # tiempo_entrega_dias, por lo que no necesita revisarse)
+    return df.dropna(
+        subset=[
+            "fecha",
+            "tiempo_entrega_dias",
+            "cantidad",
+            "precio_unitario",
+            "estado_entrega",
+            "ciudad",
+            "producto",
+            "id_venta",
+            "cliente_id",
+            "stock_inicial_producto",
+            "stock_final_producto",
+        ]
     )
 
-    # Calcular ingreso total
-    df["ingreso_total"] = df["cantidad"] * df["precio_unitario"]
-
-    # Retornar dataset con datos limpios (sin valores nulos)
-    return df.dropna()
-
 
 def most_sold_product_by_city(df: pd.DataFrame) -> pd.DataFrame:
     """
     Identifica el producto más vendido en cada ciudad.
 
-    Agrupa las ventas por ciudad y producto, luego selecciona el producto
-    con mayor cantidad vendida en cada ciudad.
+    Acumula en una sola pasada las cantidades vendidas en una matriz
+    ciudad × producto indexada por los códigos categóricos, luego selecciona
+    el producto con mayor cantidad vendida en cada ciudad.
 
     Args:
         df (pd.DataFrame): DataFrame normalizado de ventas
@@ -87,15 +181,48 @@ def most_sold_product_by_city(df: pd.DataFrame) -> pd.DataFrame:
         Cali      Leche Vegetal      120
         Medellín  Granola            180
     """
-    # Agrupar por ciudad y producto, luego sumar cantidades
-    sales_by_city_product = (
-        df.groupby(["ciudad", "producto"])["cantidad"].sum().reset_index()
+    # Trabajar solo con las columnas necesarias
+    df = df[["ciudad", "producto", "cantidad"]]
+
+    ciudades = df["ciudad"].astype("category").cat
+    productos = df["producto"].astype("category").cat
+    n_ciudades = len(ciudades.categories)
+    n_productos = len(productos.categories)
+
+    # Sin ciudades o productos no hay ranking (argmax falla con ejes vacíos)
+    if n_ciudades == 0 or n_productos == 0:
+        return df.iloc[:0].reset_index(drop=True)
+
+    # Descartar filas sin ciudad o producto (código -1)
+    ciudad_codes = ciudades.codes.to_numpy().astype(np.int64)
+    producto_codes = productos.codes.to_numpy().astype(np.int64)
+    validas = (ciudad_codes >= 0) & (producto_codes >= 0)
+    ciudad_codes = ciudad_codes[validas]
+    producto_codes = producto_codes[validas]
+
+    # Sumar cantidades por celda (ciudad, producto) en una matriz densa
+    celdas = ciudad_codes * n_productos + producto_codes
+    n_celdas = n_ciudades * n_productos
+    acumulado = np.bincount(
+        celdas, weights=df["cantidad"].to_numpy()[validas], minlength=n_celdas
+    ).reshape(n_ciudades, n_productos)
+    observadas = np.bincount(celdas, minlength=n_celdas).reshape(
+        n_ciudades, n_productos
     )
 
-    # Retornar el producto con mayor cantidad por ciudad
-    return sales_by_city_product.loc[
-        sales_by_city_product.groupby("ciudad")["cantidad"].idxmax()
-    ]
+    # Producto con mayor cantidad por ciudad entre las combinaciones con ventas
+    # (en empates, el primero en orden alfabético, igual que idxmax)
+    top = np.where(observadas > 0, acumulado, -np.inf).argmax(axis=1)
+    filas = np.flatnonzero(observadas.any(axis=1))
+    cantidades = acumulado[filas, top[filas]].astype(df["cantidad"].dtype)
+
+    return pd.DataFrame(
+        {
+            "ciudad": ciudades.categories[filas],
+            "producto": productos.categories[top[filas]],
+            "cantidad": cantidades,
+        }
+    )
 
 
 def higher_product_delay_or_cancelled(df: pd.DataFrame) -> pd.DataFrame:
@@ -118,13 +245,15 @@ def higher_product_delay_or_cancelled(df: pd.DataFrame) -> pd.DataFrame:
         Leche Vegetal         20
         Frutas Orgánicas      17
     """
+    # Trabajar solo con las columnas necesarias
+    df = df[["estado_entrega", "producto"]]
+
     # Filtrar órdenes retrasadas o canceladas y contar por producto
-    return (
-        df[df["estado_entrega"].isin(["Retrasado", "Cancelado"])]
-        .groupby("producto")
-        .size()
-        .reset_index(name="cantidad_ordenes")
-    )
+    mask = df["estado_entrega"].isin(["Retrasado", "Cancelado"])
+    conteo = df.loc[mask, "producto"].value_counts()
+
+    # Descartar categorías sin órdenes problemáticas
+    return conteo[conteo > 0].sort_index().reset_index(name="cantidad_ordenes")
 
 
 def successful_logistic_by_city(df: pd.DataFrame) -> pd.DataFrame:
@@ -150,14 +279,18 @@ def successful_logistic_by_city(df: pd.DataFrame) -> pd.DataFrame:
         Cali      120           100                83.33
         Medellín  180           140                77.78
     """
+    # Trabajar solo con las columnas necesarias
+    df = df[["ciudad", "id_venta", "estado_entrega"]]
+
+    # Marcar las órdenes entregadas con una comparación vectorizada
+    df = df.assign(_ok=df["estado_entrega"] == "Entregado")
+
     # Agrupar por ciudad y calcular estadísticas de éxito
     success_stats = (
-        df.groupby("ciudad")
+        df.groupby("ciudad", observed=True)
         .agg(
             total_ordenes=pd.NamedAgg(column="id_venta", aggfunc="count"),
-            ordenes_exitosas=pd.NamedAgg(
-                column="estado_entrega", aggfunc=lambda x: (x == "Entregado").sum()
-            ),
+            ordenes_exitosas=pd.NamedAgg(column="_ok", aggfunc="sum"),
         )
         .reset_index()
     )
@@ -185,6 +318,7 @@ def orchestrate_analysis():
     5. Genera visualizaciones en un gráfico combinado
 
     Archivos generados:
+        - reportes/_normalized_ventas_pedidos_500.parquet (datos normalizados)
         - reportes/productos_mas_vendidos_por_ciudad.csv
         - reportes/productos_con_mayor_retraso_o_cancelacion.csv
         - reportes/logistica_exito_por_ciudad.csv
@@ -203,97 +337,136 @@ def orchestrate_analysis():
     output_dir = Path(Path.cwd() / "reportes")
     output_dir.mkdir(parents=True, exist_ok=True)
 
-    # Análisis 1: Productos más vendidos por ciudad
-    productos_mas_vendidos = most_sold_product_by_city(normalizada_ventas_pedidos)
-    productos_mas_vendidos.to_csv(
-        output_dir / "productos_mas_vendidos_por_ciudad.csv", index=False
-    )
+    # Escribir los reportes en segundo plano mientras se generan los gráficos
+    tareas = []
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        # Guardar los datos normalizados para reutilizarlos en la migración
+        tareas.append(
+            executor.submit(
+                normalizada_ventas_pedidos.to_parquet,
+                normalized_cache_path("ventas_pedidos_500.csv"),
+                index=False,
+            )
+        )
 
-    # Análisis 2: Productos con mayor retraso o cancelación
-    productos_con_mayor_retraso_o_cancelacion = higher_product_delay_or_cancelled(
-        normalizada_ventas_pedidos
-    )
-    productos_con_mayor_retraso_o_cancelacion.to_csv(
-        output_dir / "productos_con_mayor_retraso_o_cancelacion.csv", index=False
-    )
+        # Análisis 1: Productos más vendidos por ciudad
+        productos_mas_vendidos = most_sold_product_by_city(normalizada_ventas_pedidos)
+        tareas.append(
+            executor.submit(
+                productos_mas_vendidos.to_csv,
+                output_dir / "productos_mas_vendidos_por_ciudad.csv",
+                index=False,
+            )
+        )
 
-    # Análisis 3: Logística de éxito por ciudad
-    logistica_exito_por_ciudad = successful_logistic_by_city(normalizada_ventas_pedidos)
-    logistica_exito_por_ciudad.to_csv(
-        output_dir / "logistica_exito_por_ciudad.csv", index=False
-    )
+        # Análisis 2: Productos con mayor retraso o cancelación
+        productos_con_mayor_retraso_o_cancelacion = higher_product_delay_or_cancelled(
+            normalizada_ventas_pedidos
+        )
+        tareas.append(
+            executor.submit(
+                productos_con_mayor_retraso_o_cancelacion.to_csv,
+                output_dir / "productos_con_mayor_retraso_o_cancelacion.csv",
+                index=False,
+            )
+        )
 
-    # Configurar el estilo de visualización
-    sns.set_style("whitegrid")
-
-    # Crear figura con 3 subplots (1 fila, 3 columnas)
-    fig, axes = plt.subplots(1, 3, figsize=(20, 6))
-
-    # Gráfico 1: Productos más vendidos por ciudad
-    sns.barplot(
-        data=productos_mas_vendidos,
-        x="ciudad",
-        y="cantidad",
-        hue="ciudad",
-        ax=axes[0],
-        palette="Blues_d",
-        legend=False,
-    )
-    axes[0].set_title(
-        "Productos Más Vendidos por Ciudad", fontsize=14, fontweight="bold"
-    )
-    axes[0].set_ylabel("Cantidad", fontsize=12)
-    axes[0].set_xlabel("Ciudad", fontsize=12)
-    axes[0].tick_params(axis="x", rotation=45)
-
-    # Gráfico 2: Productos con mayor retraso o cancelación
-    # Ordenar por cantidad de órdenes problemáticas (descendente)
-    productos_sorted = productos_con_mayor_retraso_o_cancelacion.sort_values(
-        "cantidad_ordenes", ascending=False
-    )
-    sns.barplot(
-        data=productos_sorted,
-        x="producto",
-        y="cantidad_ordenes",
-        hue="producto",
-        ax=axes[1],
-        palette="Reds_r",
-        legend=False,
-    )
-    axes[1].set_title(
-        "Productos con Mayor Retraso o Cancelación", fontsize=14, fontweight="bold"
-    )
-    axes[1].set_ylabel("Cantidad de Órdenes Problemáticas", fontsize=12)
-    axes[1].set_xlabel("Producto", fontsize=12)
-    axes[1].tick_params(axis="x", rotation=45)
-
-    # Gráfico 3: Logística de éxito por ciudad
-    sns.barplot(
-        data=logistica_exito_por_ciudad,
-        x="ciudad",
-        y="porcentaje_exitoso",
-        hue="ciudad",
-        ax=axes[2],
-        palette="Greens_d",
-        legend=False,
-    )
-    axes[2].set_title(
-        "Porcentaje de Éxito Logístico por Ciudad", fontsize=14, fontweight="bold"
-    )
-    axes[2].set_ylabel("Porcentaje (%)", fontsize=12)
-    axes[2].set_xlabel("Ciudad", fontsize=12)
-    axes[2].tick_params(axis="x", rotation=45)
+        # Análisis 3: Logística de éxito por ciudad
+        logistica_exito_por_ciudad = successful_logistic_by_city(
+            normalizada_ventas_pedidos
+        )
+        tareas.append(
+            executor.submit(
+                logistica_exito_por_ciudad.to_csv,
+                output_dir / "logistica_exito_por_ciudad.csv",
+                index=False,
+            )
+        )
 
-    # Ajustar el espaciado entre subplots
-    plt.tight_layout()
+        # Configurar el estilo de visualización
+        sns.set_style("whitegrid")
+
+        # Crear figura con 3 subplots (1 fila, 3 columnas)
+        fig, axes = plt.subplots(1, 3, figsize=(20, 6))
+
+        # Gráfico 1: Productos más vendidos por ciudad
+        sns.barplot(
+            data=productos_mas_vendidos,
+            x="ciudad",
+            y="cantidad",
+            hue="ciudad",
+            ax=axes[0],
+            palette="Blues_d",
+            legend=False,
+        )
+        axes[0].set_title(
+            "Productos Más Vendidos por Ciudad", fontsize=14, fontweight="bold"
+        )
+        axes[0].set_ylabel("Cantidad", fontsize=12)
+        axes[0].set_xlabel("Ciudad", fontsize=12)
+        axes[0].tick_params(axis="x", rotation=45)
+
+        # Gráfico 2: Productos con mayor retraso o cancelación
+        # Ordenar por cantidad de órdenes problemáticas (descendente)
+        productos_sorted = productos_con_mayor_retraso_o_cancelacion.sort_values(
+            "cantidad_ordenes", ascending=False
+        )
+        # producto es categórico: fijar el orden explícitamente
+        orden_productos = productos_sorted["producto"].tolist()
+        sns.barplot(
+            data=productos_sorted,
+            x="producto",
+            y="cantidad_ordenes",
+            hue="producto",
+            order=orden_productos,
+            hue_order=orden_productos,
+            ax=axes[1],
+            palette="Reds_r",
+            legend=False,
+        )
+        axes[1].set_title(
+            "Productos con Mayor Retraso o Cancelación", fontsize=14, fontweight="bold"
+        )
+        axes[1].set_ylabel("Cantidad de Órdenes Problemáticas", fontsize=12)
+        axes[1].set_xlabel("Producto", fontsize=12)
+        axes[1].tick_params(axis="x", rotation=45)
+
+        # Gráfico 3: Logística de éxito por ciudad
+        sns.barplot(
+            data=logistica_exito_por_ciudad,
+            x="ciudad",
+            y="porcentaje_exitoso",
+            hue="ciudad",
+            ax=axes[2],
+            palette="Greens_d",
+            legend=False,
+        )
+        axes[2].set_title(
+            "Porcentaje de Éxito Logístico por Ciudad", fontsize=14, fontweight="bold"
+        )
+        axes[2].set_ylabel("Porcentaje (%)", fontsize=12)
+        axes[2].set_xlabel("Ciudad", fontsize=12)
+        axes[2].tick_params(axis="x", rotation=45)
+
+        # Ajustar el espaciado entre subplots
+        plt.tight_layout()
+
+        # Guardar la figura como imagen de alta resolución
+        tareas.append(
+            executor.submit(
+                fig.savefig,
+                output_dir / "analisis_ventas_completo.png",
+                dpi=150,
+                bbox_inches="tight",
+            )
+        )
 
-    # Guardar la figura como imagen de alta resolución
-    plt.savefig(
-        output_dir / "analisis_ventas_completo.png", dpi=300, bbox_inches="tight"
-    )
+        # Esperar las escrituras y propagar cualquier error
+        for tarea in tareas:
+            tarea.result()
 
-    # Mostrar la figura
-    plt.show()
+    # Liberar la figura una vez guardada
+    plt.close(fig)
 
     print(f"Análisis completado exitosamente")
     print(f"Reportes guardados en: {output_dir}")
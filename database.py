@@ -1,7 +1,9 @@
 import sqlite3
+from pathlib import Path
+from typing import Iterator
 
 import pandas as pd
-from analysis import load_csv_into_df, normalize_dataframe
+from analysis import load_csv_in_chunks, normalize_dataframe, normalized_cache_path
 
 
 class DatabaseMigrator:
@@ -20,10 +22,16 @@ class DatabaseMigrator:
 
     def connect(self):
         """Establece conexión con la base de datos SQLite."""
-        self.conn = sqlite3.connect(self.db_path)
+        # Sin transacciones implícitas: migrate() controla BEGIN/COMMIT
+        self.conn = sqlite3.connect(self.db_path, isolation_level=None)
         self.cursor = self.conn.cursor()
         # Habilitar foreign keys en SQLite
         self.cursor.execute("PRAGMA foreign_keys = ON")
+        # Ajustes de escritura para carga masiva
+        self.cursor.execute("PRAGMA journal_mode = WAL")
+        self.cursor.execute("PRAGMA synchronous = NORMAL")
+        self.cursor.execute("PRAGMA temp_store = MEMORY")
+        self.cursor.execute("PRAGMA cache_size = -200000")
 
     def disconnect(self):
         """Cierra la conexión con la base de datos."""
@@ -59,7 +67,7 @@ class DatabaseMigrator:
 
         self.cursor.execute("""
             CREATE TABLE IF NOT EXISTS ventas (
-                id_venta INTEGER PRIMARY KEY,
+                id_venta INTEGER PRIMARY KEY AUTOINCREMENT,
                 id_cliente TEXT NOT NULL,
                 id_ciudad INTEGER NOT NULL,
                 id_producto INTEGER NOT NULL,
@@ -94,109 +102,136 @@ class DatabaseMigrator:
             )
         """)
 
-        self.conn.commit()
-
     def migrate_cities(self, df: pd.DataFrame) -> dict[str, int]:
         if self.cursor is None or self.conn is None:
             raise ValueError("No se ha establecido una conexión con la base de datos.")
 
-        ciudades_unicas = df["ciudad"].unique()
-        ciudad_map = {}
-
-        for ciudad in ciudades_unicas:
-            self.cursor.execute(
-                """
-                INSERT OR IGNORE INTO ciudades (nombre_ciudad)
-                VALUES (?)
-            """,
-                (ciudad,),
-            )
+        ciudades_unicas = df["ciudad"].unique().tolist()
 
-            self.cursor.execute(
-                "SELECT id_ciudad FROM ciudades WHERE nombre_ciudad = ?", (ciudad,)
-            )
-            ciudad_map[ciudad] = self.cursor.fetchone()[0]
+        self.cursor.executemany(
+            "INSERT OR IGNORE INTO ciudades (nombre_ciudad) VALUES (?)",
+            [(ciudad,) for ciudad in ciudades_unicas],
+        )
 
-        self.conn.commit()
-        return ciudad_map
+        # Recuperar todos los ids en una sola consulta
+        placeholders = ",".join("?" * len(ciudades_unicas))
+        self.cursor.execute(
+            f"SELECT nombre_ciudad, id_ciudad FROM ciudades "
+            f"WHERE nombre_ciudad IN ({placeholders})",
+            ciudades_unicas,
+        )
+        return dict(self.cursor.fetchall())
 
     def migrate_products(self, df: pd.DataFrame) -> dict[str, int]:
         if self.cursor is None or self.conn is None:
             raise ValueError("No se ha establecido una conexión con la base de datos.")
 
-        productos_unicos = df["producto"].unique()
-        producto_map = {}
+        productos_unicos = df["producto"].unique().tolist()
 
-        for producto in productos_unicos:
-            self.cursor.execute(
-                """
-                INSERT OR IGNORE INTO productos (nombre_producto)
-                VALUES (?)
-            """,
-                (producto,),
-            )
-
-            self.cursor.execute(
-                "SELECT id_producto FROM productos WHERE nombre_producto = ?",
-                (producto,),
-            )
-            producto_map[producto] = self.cursor.fetchone()[0]
+        self.cursor.executemany(
+            "INSERT OR IGNORE INTO productos (nombre_producto) VALUES (?)",
+            [(producto,) for producto in productos_unicos],
+        )
 
-        self.conn.commit()
-        return producto_map
+        # Recuperar todos los ids en una sola consulta
+        placeholders = ",".join("?" * len(productos_unicos))
+        self.cursor.execute(
+            f"SELECT nombre_producto, id_producto FROM productos "
+            f"WHERE nombre_producto IN ({placeholders})",
+            productos_unicos,
+        )
+        return dict(self.cursor.fetchall())
 
     def migrate_clients(self, df: pd.DataFrame):
         if self.cursor is None or self.conn is None:
             raise ValueError("No se ha establecido una conexión con la base de datos.")
 
-        clientes_unicos = df["cliente_id"].unique()
+        clientes_unicos = df["cliente_id"].astype(str).unique().tolist()
 
-        for cliente in clientes_unicos:
-            self.cursor.execute(
-                """
-                INSERT OR IGNORE INTO clientes (id_cliente)
-                VALUES (?)
-            """,
-                (cliente,),
-            )
-
-        self.conn.commit()
+        self.cursor.executemany(
+            "INSERT OR IGNORE INTO clientes (id_cliente) VALUES (?)",
+            [(cliente,) for cliente in clientes_unicos],
+        )
 
     def migrate_sales(self, df: pd.DataFrame, ciudad_map: dict, producto_map: dict):
         if self.cursor is None or self.conn is None:
             raise ValueError("No se ha establecido una conexión con la base de datos.")
 
-        for _, row in df.iterrows():
-            # Calcular fecha de entrega
-            fecha = row["fecha"]
-            fecha_entrega = row["fecha_entrega"]
-
-            # Insertar venta con datos del producto
-            self.cursor.execute(
-                """
-                INSERT OR IGNORE INTO ventas
-                (id_venta, id_cliente, id_ciudad, id_producto, fecha, fecha_entrega,
-                 tiempo_entrega_dias, estado_entrega, cantidad, precio_unitario,
-                 stock_inicial, stock_final)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-                (
-                    int(row["id_venta"]),
-                    str(row["cliente_id"]),
-                    ciudad_map[row["ciudad"]],
-                    producto_map[row["producto"]],
-                    fecha.strftime("%Y-%m-%d"),
-                    fecha_entrega.strftime("%Y-%m-%d"),
-                    int(row["tiempo_entrega_dias"]),
-                    row["estado_entrega"],
-                    int(row["cantidad"]),
-                    float(row["precio_unitario"]),
-                    int(row["stock_inicial_producto"]),
-                    int(row["stock_final_producto"]),
-                ),
+        # Formatear fechas de forma vectorizada
+        fechas = df["fecha"].dt.strftime("%Y-%m-%d").tolist()
+        fechas_entrega = df["fecha_entrega"].dt.strftime("%Y-%m-%d").tolist()
+
+        # Construir filas a partir de columnas completas (tipos nativos de Python)
+        rows = list(
+            zip(
+                df["id_venta"].astype(int).tolist(),
+                df["cliente_id"].astype(str).tolist(),
+                df["ciudad"].map(ciudad_map).astype(int).tolist(),
+                df["producto"].map(producto_map).astype(int).tolist(),
+                fechas,
+                fechas_entrega,
+                df["tiempo_entrega_dias"].astype(int).tolist(),
+                df["estado_entrega"].tolist(),
+                df["cantidad"].astype(int).tolist(),
+                df["precio_unitario"].astype(float).tolist(),
+                df["stock_inicial_producto"].astype(int).tolist(),
+                df["stock_final_producto"].astype(int).tolist(),
             )
+        )
+
+        # Insertar todas las ventas en una sola llamada
+        self.cursor.executemany(
+            """
+            INSERT OR IGNORE INTO ventas
+            (id_venta, id_cliente, id_ciudad, id_producto, fecha, fecha_entrega,
+             tiempo_entrega_dias, estado_entrega, cantidad, precio_unitario,
+             stock_inicial, stock_final)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+            rows,
+        )
+
+    @staticmethod
+    def load_clean_chunks(csv_path: str, chunksize: int) -> Iterator[pd.DataFrame]:
+        """
+        Obtiene los datos de ventas normalizados, por bloques.
+
+        Si orchestrate_analysis ya guardó una copia normalizada más reciente
+        que el CSV, se utiliza directamente; en caso contrario se lee el CSV
+        por bloques y se normaliza cada uno.
+
+        Args:
+            csv_path (str): Ruta del archivo CSV de origen
+            chunksize (int): Número máximo de filas por bloque al leer el CSV
 
-        self.conn.commit()
+        Yields:
+            pd.DataFrame: DataFrame normalizado
+        """
+        cache_path = normalized_cache_path(csv_path)
+        if (
+            cache_path.exists()
+            and cache_path.stat().st_mtime >= (Path.cwd() / csv_path).stat().st_mtime
+        ):
+            yield pd.read_parquet(cache_path)
+            return
+
+        for chunk in load_csv_in_chunks(csv_path, chunksize):
+            yield normalize_dataframe(chunk)
+
+    @staticmethod
+    def latest_stock(df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Selecciona el registro más reciente de cada combinación ciudad-producto.
+
+        Args:
+            df (pd.DataFrame): DataFrame normalizado de ventas
+
+        Returns:
+            pd.DataFrame: DataFrame con columnas
+                          [ciudad, producto, fecha, stock_final_producto]
+        """
+        idx = df.groupby(["ciudad", "producto"], observed=True)["fecha"].idxmax()
+        return df.loc[idx, ["ciudad", "producto", "fecha", "stock_final_producto"]]
 
     def initialize_inventory(
         self, df: pd.DataFrame, ciudad_map: dict, producto_map: dict
@@ -204,48 +239,63 @@ class DatabaseMigrator:
         if self.cursor is None or self.conn is None:
             raise ValueError("Database connection is not initialized.")
 
-        df_sorted = df.sort_values("fecha", ascending=False)
-
         # Agrupar por ciudad y producto, tomar el stock final más reciente
-        ultimo_stock = df_sorted.groupby(["ciudad", "producto"]).first().reset_index()
-
-        for _, row in ultimo_stock.iterrows():
-            id_ciudad = ciudad_map[row["ciudad"]]
-            id_producto = producto_map[row["producto"]]
-            stock_actual = int(row["stock_final_producto"])
-
-            self.cursor.execute(
-                """
-                INSERT OR REPLACE INTO inventario
-                (id_producto, id_ciudad, stock_actual)
-                VALUES (?, ?, ?)
-            """,
-                (id_producto, id_ciudad, stock_actual),
-            )
-
-        self.conn.commit()
-
-    def migrate(self, csv_path: str):
+        ultimo_stock = self.latest_stock(df)
+
+        ciudades = ultimo_stock["ciudad"].to_numpy()
+        productos = ultimo_stock["producto"].to_numpy()
+        stocks = ultimo_stock["stock_final_producto"].astype(int).to_numpy()
+
+        self.cursor.executemany(
+            """
+            INSERT OR REPLACE INTO inventario
+            (id_producto, id_ciudad, stock_actual)
+            VALUES (?, ?, ?)
+        """,
+            [
+                (producto_map[producto], ciudad_map[ciudad], int(stock))
+                for ciudad, producto, stock in zip(ciudades, productos, stocks)
+            ],
+        )
+
+    def migrate(self, csv_path: str, chunksize: int = 50_000):
         try:
             print("INICIANDO MIGRACIÓN DE DATOS")
 
             # Conectar a la base de datos
             self.connect()
 
+            # Ejecutar toda la migración en una única transacción
+            self.cursor.execute("BEGIN")
+
             # Crear tablas
             self.create_tables()
 
-            # Cargar CSV
-            df = load_csv_into_df(csv_path)
-
-            clean_df = normalize_dataframe(df)
-
-            # Migrar datos
-            ciudad_map = self.migrate_cities(clean_df)
-            producto_map = self.migrate_products(clean_df)
-            self.migrate_clients(clean_df)
-            self.migrate_sales(clean_df, ciudad_map, producto_map)
-            self.initialize_inventory(clean_df, ciudad_map, producto_map)
+            ciudad_map: dict[str, int] = {}
+            producto_map: dict[str, int] = {}
+            ultimo_stock: pd.DataFrame | None = None
+
+            # Cargar y migrar los datos por bloques para acotar el uso de memoria
+            for clean_df in self.load_clean_chunks(csv_path, chunksize):
+                # Migrar catálogos (idempotente) y ventas del bloque
+                ciudad_map.update(self.migrate_cities(clean_df))
+                producto_map.update(self.migrate_products(clean_df))
+                self.migrate_clients(clean_df)
+                self.migrate_sales(clean_df, ciudad_map, producto_map)
+
+                # Conservar solo el stock más reciente visto hasta ahora
+                ultimo_bloque = self.latest_stock(clean_df)
+                if ultimo_stock is not None:
+                    ultimo_bloque = self.latest_stock(
+                        pd.concat([ultimo_stock, ultimo_bloque], ignore_index=True)
+                    )
+                ultimo_stock = ultimo_bloque.reset_index(drop=True)
+
+            # Inicializar inventario con el stock conciliado de todos los bloques
+            if ultimo_stock is not None:
+                self.initialize_inventory(ultimo_stock, ciudad_map, producto_map)
+
+            self.conn.commit()
 
             print("MIGRACIÓN COMPLETADA EXITOSAMENTE")
 
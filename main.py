@@ -1,22 +1,22 @@
 import sys
-from tokenize import STAR
 
 from analysis import orchestrate_analysis
 from database import orchestrate_database_migration
 from tinker import start_ui
 
+COMMANDS = {
+    "analysis": orchestrate_analysis,
+    "database": orchestrate_database_migration,
+    "ui": start_ui,
+}
+
 if __name__ == "__main__":
-    args = set(sys.argv)
+    cmd = sys.argv[1] if len(sys.argv) > 1 else None
 
-    if len(args) == 0:
+    if cmd is None:
         print("No arguments provided")
         print("functionality: python main.py <command>")
-
-    if "analysis" in args:
-        orchestrate_analysis()
-    elif "database" in args:
-        orchestrate_database_migration()
-    elif "ui" in args:
-        start_ui()
+    elif cmd in COMMANDS:
+        COMMANDS[cmd]()
     else:
         print("invalid command")
@@ -0,0 +1,78 @@
+"""
+Pruebas de carga y normalización de ventas con valores faltantes.
+
+Ejecutar con: python -m unittest discover tests
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from analysis import (
+    load_csv_in_chunks,
+    load_csv_into_df,
+    most_sold_product_by_city,
+    normalize_dataframe,
+)
+from database import DatabaseMigrator
+
+HEADER = (
+    "id_venta,fecha,ciudad,producto,cantidad,precio_unitario,cliente_id,"
+    "tiempo_entrega_dias,estado_entrega,stock_inicial_producto,"
+    "stock_final_producto"
+)
+ROWS = [
+    "1,2023-01-14,Bogotá,Granola,7,100.0,C1,1,Entregado,16,9",
+    "2,,Cali,Granola,3,100.0,C2,2,Entregado,9,6",
+    "3,2023-01-16,Cali,Pan Vegano,5,50.0,C3,3,Cancelado,20,15",
+]
+
+
+class NormalizeMissingValuesTest(unittest.TestCase):
+    def setUp(self):
+        self._cwd = os.getcwd()
+        self._tmp = tempfile.TemporaryDirectory()
+        os.chdir(self._tmp.name)
+
+    def tearDown(self):
+        os.chdir(self._cwd)
+        self._tmp.cleanup()
+
+    def write_csv(self, rows):
+        Path("ventas.csv").write_text("\n".join([HEADER, *rows]) + "\n")
+        return "ventas.csv"
+
+    def test_blank_fecha_row_is_dropped(self):
+        df = normalize_dataframe(load_csv_into_df(self.write_csv(ROWS)))
+
+        self.assertEqual(df["id_venta"].tolist(), [1, 3])
+        self.assertEqual(str(df["fecha_entrega"].iloc[1].date()), "2023-01-19")
+
+    def test_blank_fecha_row_is_dropped_in_chunks(self):
+        chunks = load_csv_in_chunks(self.write_csv(ROWS), chunksize=1)
+        ids = [i for chunk in chunks for i in normalize_dataframe(chunk)["id_venta"]]
+
+        self.assertEqual(ids, [1, 3])
+
+    def test_header_only_csv(self):
+        df = normalize_dataframe(load_csv_into_df(self.write_csv([])))
+
+        self.assertTrue(df.empty)
+        self.assertTrue(most_sold_product_by_city(df).empty)
+
+    def test_migrate_header_only_csv(self):
+        migrator = DatabaseMigrator("test.db")
+        migrator.migrate(self.write_csv([]))
+
+        migrator.connect()
+        migrator.cursor.execute("SELECT COUNT(*) FROM ventas")
+        self.assertEqual(migrator.cursor.fetchone()[0], 0)
+        migrator.disconnect()
+
+
+if __name__ == "__main__":
+    unittest.main()
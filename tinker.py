@@ -15,14 +15,89 @@ Autor: Santiago Torres
 Fecha: Noviembre 2024
 """
 
+import queue
 import sqlite3
+import threading
 import tkinter as tk
 from datetime import datetime, timedelta
 from tkinter import messagebox, scrolledtext, ttk
-from typing import List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 
+import numpy as np
 import pandas as pd
 
+# Clasificación del stock: límites de cada tramo y su tag / estado
+_STOCK_LIMITES = (10, 20)
+_STOCK_TAGS = np.array(["bajo", "medio", "ok"])
+_STOCK_ESTADOS = np.array(["🔴 BAJO", "🟡 MEDIO", "🟢 OK"])
+
+# Caracteres que se descartan al leer un precio ("$1,234.50 " -> "1234.50")
+_PRICE_TRANS = str.maketrans("", "", "$, ")
+
+# Sentencias SQL de uso frecuente (texto idéntico entre llamadas para que
+# SQLite reutilice la sentencia preparada de su caché)
+_Q_STOCK = """
+    SELECT id_inventario, stock_actual
+    FROM inventario
+    WHERE id_producto = ? AND id_ciudad = ?
+"""
+
+_Q_INV_INDEX = """
+    SELECT c.nombre_ciudad, p.nombre_producto, p.id_producto, c.id_ciudad
+    FROM inventario i
+    JOIN productos p ON i.id_producto = p.id_producto
+    JOIN ciudades c ON i.id_ciudad = c.id_ciudad
+"""
+
+_Q_INV_FULL = """
+    SELECT nombre_ciudad, nombre_producto, stock_actual
+    FROM v_inventario_full
+    ORDER BY nombre_ciudad, nombre_producto
+"""
+
+_Q_ALERTS = """
+    SELECT
+        c.nombre_ciudad,
+        p.nombre_producto,
+        i.stock_actual,
+        10 as stock_minimo,
+        (10 - i.stock_actual) as faltante
+    FROM inventario i
+    JOIN productos p ON i.id_producto = p.id_producto
+    JOIN ciudades c ON i.id_ciudad = c.id_ciudad
+    WHERE i.stock_actual < 10
+    ORDER BY i.stock_actual ASC, c.nombre_ciudad, p.nombre_producto
+"""
+
+_Q_ALERTS_PAGE = _Q_ALERTS + " LIMIT ? OFFSET ?"
+
+_Q_ALERTS_COUNT = "SELECT COUNT(*) FROM inventario WHERE stock_actual < 10"
+
+# Filas de alertas que se cargan por página
+_ALERTS_PAGE_SIZE = 100
+
+_Q_INS_VENTA = """
+    INSERT INTO ventas
+    (id_cliente, id_ciudad, id_producto, fecha, fecha_entrega,
+     tiempo_entrega_dias, estado_entrega, cantidad, precio_unitario,
+     stock_inicial, stock_final)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+_Q_UPD_INV = """
+    UPDATE inventario
+    SET stock_actual = MAX(0, stock_actual - ?),
+        ultima_actualizacion = CURRENT_TIMESTAMP
+    WHERE id_inventario = ? AND stock_actual = ?
+"""
+
+_Q_SET_INV = """
+    UPDATE inventario
+    SET stock_actual = ?,
+        ultima_actualizacion = CURRENT_TIMESTAMP
+    WHERE id_inventario = ?
+"""
+
 
 class FreshMarketApp:
     """Aplicación principal de Fresh Market."""
@@ -39,6 +114,30 @@ class FreshMarketApp:
         self.db_path = db_path
         self.conn: Optional[sqlite3.Connection] = None
 
+        # Índice (ciudad, producto) -> (id_producto, id_ciudad); estos ids se
+        # conservan al re-migrar, a diferencia de id_inventario
+        self._inv_index: Dict[Tuple[str, str], Tuple[int, int]] = {}
+
+        # Debounce de la consulta de stock y último aviso mostrado
+        self._pending_after: Optional[str] = None
+        self._last_warn: Tuple[str, ...] = ()
+
+        # Inventario completo en memoria (None = debe consultarse de nuevo)
+        self._inv_df: Optional[pd.DataFrame] = None
+
+        # Consultas de solo lectura en un hilo de fondo con su propia conexión
+        self._jobs: queue.Queue = queue.Queue()
+        self._results: queue.Queue = queue.Queue()
+        threading.Thread(target=self._worker_loop, daemon=True).start()
+
+        # Paginación de la tabla de alertas y total de productos con stock
+        # bajo (None hasta la primera consulta; luego se ajusta por pedido)
+        self._alerts_offset = 0
+        self._low_stock_count: Optional[int] = None
+
+        # Pestañas que deben refrescarse la próxima vez que se muestren
+        self._tab_dirty = {1: True, 2: True}
+
         # Configurar ventana principal
         self.root.title("Fresh Market - Sistema de Gestión")
         self.root.geometry("1200x800")
@@ -63,8 +162,12 @@ class FreshMarketApp:
         # Cargar datos iniciales
         self.load_initial_data()
 
-        # Verificar alertas de stock
-        self.check_stock_alerts()
+        # Entregar en el hilo de Tk los resultados del hilo de fondo
+        self._drain()
+
+        # Contar alertas de stock y avisar si hay productos con stock bajo
+        # (las tablas se llenan al abrir su pestaña)
+        self.actualizar_estado_alertas(avisar=True)
 
     def setup_styles(self):
         """Configura los estilos de la aplicación."""
@@ -100,8 +203,42 @@ class FreshMarketApp:
             True si la conexión fue exitosa, False en caso contrario
         """
         try:
-            self.conn = sqlite3.connect(self.db_path)
+            # Sin transacciones implícitas: las escrituras usan BEGIN/COMMIT
+            self.conn = sqlite3.connect(
+                self.db_path, isolation_level=None, cached_statements=256
+            )
             self.conn.row_factory = sqlite3.Row
+
+            # WAL y caché en memoria para reducir la latencia de los commits
+            self.conn.execute("PRAGMA journal_mode = WAL")
+            self.conn.execute("PRAGMA synchronous = NORMAL")
+            self.conn.execute("PRAGMA temp_store = MEMORY")
+            self.conn.execute("PRAGMA cache_size = -65536")
+            self.conn.execute("PRAGMA mmap_size = 268435456")
+
+            # Índice para las consultas de stock bajo (falla si no hay esquema)
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_inventario_stock "
+                "ON inventario(stock_actual)"
+            )
+
+            # Vista con el inventario y los nombres de ciudad y producto
+            self.conn.execute("""
+                CREATE VIEW IF NOT EXISTS v_inventario_full AS
+                SELECT c.nombre_ciudad, p.nombre_producto, i.stock_actual,
+                       i.id_inventario
+                FROM inventario i
+                JOIN productos p ON i.id_producto = p.id_producto
+                JOIN ciudades c ON i.id_ciudad = c.id_ciudad
+            """)
+
+            # Generar estadísticas para el planificador la primera vez
+            cursor = self.conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'"
+            )
+            if cursor.fetchone() is None:
+                self.conn.execute("ANALYZE")
+
             return True
         except sqlite3.Error as e:
             print(f"Error al conectar a la base de datos: {e}")
@@ -128,6 +265,9 @@ class FreshMarketApp:
         self.notebook.add(self.tab_alertas, text="⚠️ Alertas de Stock")
         self.create_alertas_tab()
 
+        # Refrescar cada pestaña solo cuando se muestra
+        self.notebook.bind("<<NotebookTabChanged>>", self._on_tab_changed)
+
         # Barra de estado
         self.create_status_bar()
 
@@ -259,7 +399,9 @@ class FreshMarketApp:
         )
 
         ttk.Button(
-            filter_frame, text="Actualizar", command=self.actualizar_disponibilidad
+            filter_frame,
+            text="Actualizar",
+            command=lambda: self.actualizar_disponibilidad(recargar=True),
         ).grid(row=0, column=2, padx=10)
 
         # Tabla de disponibilidad
@@ -362,12 +504,23 @@ class FreshMarketApp:
             "critico", background="#ffcccc", foreground="#cc0000"
         )
 
-        # Botón actualizar
+        # Botones actualizar y cargar más
+        button_frame = ttk.Frame(self.tab_alertas)
+        button_frame.pack(pady=10)
+
         ttk.Button(
-            self.tab_alertas,
+            button_frame,
             text="🔄 Actualizar Alertas",
             command=self.actualizar_alertas,
-        ).pack(pady=10)
+        ).pack(side="left", padx=5)
+
+        self.btn_cargar_mas = ttk.Button(
+            button_frame,
+            text="⬇️ Cargar más",
+            command=self.cargar_mas_alertas,
+            state="disabled",
+        )
+        self.btn_cargar_mas.pack(side="left", padx=5)
 
     def create_status_bar(self):
         """Crea la barra de estado en la parte inferior."""
@@ -401,18 +554,69 @@ class FreshMarketApp:
             productos = [row[0] for row in cursor.fetchall()]
             self.combo_producto["values"] = productos
 
-            # Actualizar disponibilidad
-            self.actualizar_disponibilidad()
+            # Cargar índice de inventario
+            self.load_inventory_index()
 
         except sqlite3.Error as e:
             messagebox.showerror("Error", f"Error al cargar datos: {e}")
 
+    def _on_tab_changed(self, event):
+        """Refresca la pestaña recién mostrada si quedó desactualizada."""
+        tab = self.notebook.index("current")
+        if not self._tab_dirty.get(tab):
+            return
+
+        self._tab_dirty[tab] = False
+        if tab == 1:
+            self.actualizar_disponibilidad()
+        elif tab == 2:
+            self.actualizar_alertas()
+
+    def load_inventory_index(self):
+        """Carga en memoria los ids de producto y ciudad por (ciudad, producto)."""
+        cursor = self.conn.cursor()
+        cursor.execute(_Q_INV_INDEX)
+        self._inv_index = {
+            (ciudad, producto): tuple(ids)
+            for ciudad, producto, *ids in cursor.fetchall()
+        }
+
+    def get_inventory_ids(
+        self, ciudad: str, producto: str
+    ) -> Optional[Tuple[int, int]]:
+        """
+        Obtiene los ids de producto y ciudad desde el índice en memoria.
+
+        Si la combinación no está en el índice se recarga una vez, por si el
+        inventario cambió desde que se abrió la aplicación.
+
+        Args:
+            ciudad: Nombre de la ciudad
+            producto: Nombre del producto
+
+        Returns:
+            Tupla (id_producto, id_ciudad) o None si no existe
+        """
+        ids = self._inv_index.get((ciudad, producto))
+        if ids is None:
+            self.load_inventory_index()
+            ids = self._inv_index.get((ciudad, producto))
+        return ids
+
     def on_ciudad_selected(self, event):
         """Maneja el evento de selección de ciudad."""
         self.on_producto_selected(None)
 
     def on_producto_selected(self, event):
-        """Maneja el evento de selección de producto."""
+        """Maneja el evento de selección de producto (con debounce)."""
+        # Reprogramar la consulta si llegan varias selecciones seguidas
+        if self._pending_after is not None:
+            self.root.after_cancel(self._pending_after)
+        self._pending_after = self.root.after(200, self._do_stock_check)
+
+    def _do_stock_check(self):
+        """Consulta el stock de la selección actual y avisa si es bajo."""
+        self._pending_after = None
         ciudad = self.combo_ciudad.get()
         producto = self.combo_producto.get()
 
@@ -423,21 +627,14 @@ class FreshMarketApp:
             cursor = self.conn.cursor()
 
             # Obtener solo stock disponible (sin precio)
-            cursor.execute(
-                """
-                SELECT i.stock_actual
-                FROM inventario i
-                JOIN productos p ON i.id_producto = p.id_producto
-                JOIN ciudades c ON i.id_ciudad = c.id_ciudad
-                WHERE c.nombre_ciudad = ? AND p.nombre_producto = ?
-            """,
-                (ciudad, producto),
-            )
-
-            result = cursor.fetchone()
+            result = None
+            ids = self.get_inventory_ids(ciudad, producto)
+            if ids:
+                cursor.execute(_Q_STOCK, ids)
+                result = cursor.fetchone()
 
             if result:
-                stock = result[0]
+                stock = result[1]
                 self.label_stock_disponible.config(
                     text=f"{stock} unidades",
                     foreground=self.colors["primary"]
@@ -445,8 +642,9 @@ class FreshMarketApp:
                     else self.colors["danger"],
                 )
 
-                # Verificar si hay suficiente stock
-                if stock < 10:
+                # Verificar si hay suficiente stock (un aviso por combinación)
+                if stock < 10 and (ciudad, producto) != self._last_warn:
+                    self._last_warn = (ciudad, producto)
                     messagebox.showwarning(
                         "Stock Bajo",
                         f"⚠️ Advertencia: El stock de '{producto}' en '{ciudad}' es bajo.\n"
@@ -456,10 +654,12 @@ class FreshMarketApp:
                 self.label_stock_disponible.config(
                     text="No disponible", foreground=self.colors["danger"]
                 )
-                messagebox.showwarning(
-                    "Producto No Disponible",
-                    f"El producto '{producto}' no está disponible en '{ciudad}'",
-                )
+                if (ciudad, producto) != self._last_warn:
+                    self._last_warn = (ciudad, producto)
+                    messagebox.showwarning(
+                        "Producto No Disponible",
+                        f"El producto '{producto}' no está disponible en '{ciudad}'",
+                    )
 
         except sqlite3.Error as e:
             messagebox.showerror("Error", f"Error al consultar stock: {e}")
@@ -467,9 +667,7 @@ class FreshMarketApp:
     def calcular_total(self):
         """Calcula el total del pedido."""
         try:
-            precio_text = (
-                self.entry_precio.get().strip().replace("$", "").replace(",", "")
-            )
+            precio_text = self.entry_precio.get().translate(_PRICE_TRANS)
             if not precio_text:
                 messagebox.showerror("Error", "Por favor ingresa el precio unitario")
                 return
@@ -493,7 +691,7 @@ class FreshMarketApp:
         cliente_id = self.entry_cliente_id.get().strip()
         ciudad = self.combo_ciudad.get()
         producto = self.combo_producto.get()
-        precio_text = self.entry_precio.get().strip().replace("$", "").replace(",", "")
+        precio_text = self.entry_precio.get().translate(_PRICE_TRANS)
 
         if not all([cliente_id, ciudad, producto, precio_text]):
             messagebox.showerror("Error", "Por favor completa todos los campos")
@@ -522,18 +720,11 @@ class FreshMarketApp:
             cursor = self.conn.cursor()
 
             # Verificar stock disponible (sin precio_unitario)
-            cursor.execute(
-                """
-                SELECT i.stock_actual, i.id_inventario, p.id_producto, c.id_ciudad
-                FROM inventario i
-                JOIN productos p ON i.id_producto = p.id_producto
-                JOIN ciudades c ON i.id_ciudad = c.id_ciudad
-                WHERE c.nombre_ciudad = ? AND p.nombre_producto = ?
-            """,
-                (ciudad, producto),
-            )
-
-            result = cursor.fetchone()
+            ids = self.get_inventory_ids(ciudad, producto)
+            result = None
+            if ids:
+                cursor.execute(_Q_STOCK, ids)
+                result = cursor.fetchone()
 
             if not result:
                 messagebox.showerror(
@@ -541,7 +732,8 @@ class FreshMarketApp:
                 )
                 return
 
-            stock_actual, id_inventario, id_producto, id_ciudad = result
+            id_inventario, stock_actual = result
+            id_producto, id_ciudad = ids
 
             # Verificar si hay suficiente stock
             if stock_actual < cantidad:
@@ -556,54 +748,52 @@ class FreshMarketApp:
                 if not respuesta:
                     return
 
-            # Generar ID de venta (último ID + 1)
-            cursor.execute("SELECT MAX(id_venta) FROM ventas")
-            max_id = cursor.fetchone()[0]
-            nuevo_id_venta = (max_id or 0) + 1
+            nuevo_stock = max(0, stock_actual - cantidad)
 
-            # Calcular fechas
-            fecha_actual = datetime.now().strftime("%Y-%m-%d")
-            fecha_entrega = (datetime.now() + timedelta(days=dias_entrega)).strftime(
-                "%Y-%m-%d"
+            # Fila de la venta con precio_unitario ingresado manualmente
+            venta = self._venta_row(
+                cliente_id,
+                id_ciudad,
+                id_producto,
+                cantidad,
+                precio_unitario,
+                dias_entrega,
+                stock_actual,
+                nuevo_stock,
+                datetime.now(),
             )
+            fecha_entrega = venta[4]
 
-            # Insertar venta con precio_unitario ingresado manualmente
-            cursor.execute(
-                """
-                INSERT INTO ventas
-                (id_venta, id_cliente, id_ciudad, id_producto, fecha, fecha_entrega,
-                 tiempo_entrega_dias, estado_entrega, cantidad, precio_unitario,
-                 stock_inicial, stock_final)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-                (
-                    nuevo_id_venta,
-                    cliente_id,
-                    id_ciudad,
-                    id_producto,
-                    fecha_actual,
-                    fecha_entrega,
-                    dias_entrega,
-                    "En tránsito",
-                    cantidad,
-                    precio_unitario,  # Precio ingresado manualmente
-                    stock_actual,
-                    max(0, stock_actual - cantidad),
-                ),
-            )
+            # Registrar venta y descontar inventario en una sola transacción
+            cursor.execute("BEGIN IMMEDIATE")
 
-            # Actualizar inventario
-            nuevo_stock = max(0, stock_actual - cantidad)
-            cursor.execute(
-                """
-                UPDATE inventario
-                SET stock_actual = ?, ultima_actualizacion = CURRENT_TIMESTAMP
-                WHERE id_inventario = ?
-            """,
-                (nuevo_stock, id_inventario),
-            )
+            # Descontar inventario solo si nadie lo modificó desde la lectura
+            cursor.execute(_Q_UPD_INV, (cantidad, id_inventario, stock_actual))
+            if cursor.rowcount == 0:
+                cursor.execute("ROLLBACK")
+
+                # El stock cambió fuera de la app: invalidar cachés y pestañas
+                self._inv_df = None
+                self._tab_dirty = {1: True, 2: True}
+                self.actualizar_estado_alertas()
 
-            self.conn.commit()
+                messagebox.showwarning(
+                    "Stock Modificado",
+                    f"⚠️ El stock de '{producto}' en '{ciudad}' cambió mientras "
+                    f"se registraba el pedido.\n\n"
+                    f"Revisa la disponibilidad y vuelve a intentarlo.",
+                )
+                self.on_producto_selected(None)
+                return
+
+            # Insertar venta (SQLite asigna el id_venta)
+            cursor.execute(_Q_INS_VENTA, venta)
+            nuevo_id_venta = cursor.lastrowid
+
+            cursor.execute("COMMIT")
+
+            # El inventario en memoria ya no está al día
+            self._registrar_cambios_stock([(stock_actual, nuevo_stock)])
 
             # Mensaje de éxito
             messagebox.showinfo(
@@ -621,10 +811,6 @@ class FreshMarketApp:
             # Limpiar formulario
             self.limpiar_formulario()
 
-            # Actualizar vistas
-            self.actualizar_disponibilidad()
-            self.actualizar_alertas()
-
             # Verificar si necesita reposición
             if nuevo_stock < 10:
                 messagebox.showwarning(
@@ -641,6 +827,167 @@ class FreshMarketApp:
             self.conn.rollback()
             messagebox.showerror("Error", f"Error inesperado: {e}")
 
+    @staticmethod
+    def _venta_row(
+        cliente_id: str,
+        id_ciudad: int,
+        id_producto: int,
+        cantidad: int,
+        precio_unitario: float,
+        dias_entrega: int,
+        stock_inicial: int,
+        stock_final: int,
+        fecha: datetime,
+    ) -> tuple:
+        """
+        Construye la fila de parámetros de _Q_INS_VENTA para un pedido nuevo.
+
+        Args:
+            cliente_id: ID del cliente
+            id_ciudad: ID de la ciudad
+            id_producto: ID del producto
+            cantidad: Unidades pedidas
+            precio_unitario: Precio unitario ingresado
+            dias_entrega: Días hasta la entrega
+            stock_inicial: Stock antes del pedido
+            stock_final: Stock después del pedido
+            fecha: Fecha del pedido
+
+        Returns:
+            Tupla con los 11 parámetros del INSERT en ventas
+        """
+        return (
+            cliente_id,
+            id_ciudad,
+            id_producto,
+            fecha.strftime("%Y-%m-%d"),
+            (fecha + timedelta(days=dias_entrega)).strftime("%Y-%m-%d"),
+            dias_entrega,
+            "En tránsito",
+            cantidad,
+            precio_unitario,
+            stock_inicial,
+            stock_final,
+        )
+
+    def _registrar_cambios_stock(self, cambios: List[Tuple[int, int]]):
+        """
+        Actualiza las cachés en memoria tras descontar inventario.
+
+        Args:
+            cambios: Pares (stock_antes, stock_despues) de cada inventario modificado
+        """
+        self._inv_df = None
+
+        # Las tablas se refrescan al mostrarse; alertas solo si cambió
+        self._tab_dirty[1] = True
+        if any(antes < 10 or despues < 10 for antes, despues in cambios):
+            self._tab_dirty[2] = True
+
+        # Ajustar el total de alertas con los inventarios que cruzaron el umbral
+        if self._low_stock_count is None:
+            self.actualizar_estado_alertas()
+        else:
+            self._low_stock_count += sum(
+                (despues < 10) - (antes < 10) for antes, despues in cambios
+            )
+            self.mostrar_estado_alertas()
+
+    def registrar_pedidos_batch(
+        self, pedidos: List[Tuple[str, str, str, int, float, int]]
+    ) -> int:
+        """
+        Registra varios pedidos en una sola transacción (p. ej. importaciones).
+
+        Los pedidos se descuentan del inventario en orden; el stock nunca
+        baja de 0. Si algún pedido falla no se registra ninguno.
+
+        Args:
+            pedidos: Tuplas (cliente_id, ciudad, producto, cantidad,
+                precio_unitario, dias_entrega)
+
+        Returns:
+            Número de pedidos registrados
+
+        Raises:
+            ValueError: Si la cantidad o el precio no son mayores a 0, o si algún
+                producto no está disponible en su ciudad
+            sqlite3.Error: Si falla la escritura (la transacción se revierte)
+        """
+        # Validar y resolver ids antes de abrir la transacción
+        resueltos = []
+        for cliente_id, ciudad, producto, cantidad, precio, dias in pedidos:
+            if cantidad <= 0:
+                raise ValueError(
+                    f"La cantidad debe ser mayor a 0 (cliente {cliente_id})"
+                )
+            if precio <= 0:
+                raise ValueError(f"El precio debe ser mayor a 0 (cliente {cliente_id})")
+
+            ids = self.get_inventory_ids(ciudad, producto)
+            if ids is None:
+                raise ValueError(f"Producto '{producto}' no disponible en '{ciudad}'")
+            resueltos.append((*ids, cliente_id, cantidad, precio, dias))
+
+        if not resueltos:
+            return 0
+
+        fecha = datetime.now()
+        cursor = self.conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            # Inventario y stock de cada combinación, leídos con el lock tomado
+            id_inventario: Dict[Tuple[int, int], int] = {}
+            stock_inicial: Dict[Tuple[int, int], int] = {}
+            for id_producto, id_ciudad, *_ in resueltos:
+                ids = (id_producto, id_ciudad)
+                if ids not in stock_inicial:
+                    cursor.execute(_Q_STOCK, ids)
+                    result = cursor.fetchone()
+                    if result is None:
+                        raise ValueError(
+                            f"No hay inventario para el producto {id_producto} "
+                            f"en la ciudad {id_ciudad}"
+                        )
+                    id_inventario[ids], stock_inicial[ids] = result
+
+            stock = dict(stock_inicial)
+            ventas = []
+            for id_producto, id_ciudad, cliente_id, *resto in resueltos:
+                cantidad, precio, dias = resto
+                ids = (id_producto, id_ciudad)
+                antes = stock[ids]
+                stock[ids] = max(0, antes - cantidad)
+                ventas.append(
+                    self._venta_row(
+                        cliente_id,
+                        id_ciudad,
+                        id_producto,
+                        cantidad,
+                        precio,
+                        dias,
+                        antes,
+                        stock[ids],
+                        fecha,
+                    )
+                )
+
+            cursor.executemany(_Q_INS_VENTA, ventas)
+            cursor.executemany(
+                _Q_SET_INV,
+                [(nuevo, id_inventario[ids]) for ids, nuevo in stock.items()],
+            )
+            cursor.execute("COMMIT")
+        except BaseException:
+            # Revertir ante cualquier error para no dejar la transacción abierta
+            cursor.execute("ROLLBACK")
+            raise
+
+        self._registrar_cambios_stock(
+            [(stock_inicial[i], stock[i]) for i in stock_inicial]
+        )
+        return len(ventas)
+
     def limpiar_formulario(self):
         """Limpia todos los campos del formulario."""
         self.entry_cliente_id.delete(0, tk.END)
@@ -653,137 +1000,217 @@ class FreshMarketApp:
         self.entry_precio.insert(0, "0.00")
         self.label_total.config(text="$0.00")
 
-    def actualizar_disponibilidad(self):
-        """Actualiza la tabla de disponibilidad de productos."""
-        # Limpiar tabla
-        for item in self.tree_disponibilidad.get_children():
-            self.tree_disponibilidad.delete(item)
-
-        if not self.conn:
-            return
+    def _worker_loop(self):
+        """
+        Ejecuta en segundo plano las consultas encoladas con _submit.
 
+        Usa su propia conexión y deja cada resultado en la cola de resultados;
+        nunca toca widgets ni muestra diálogos desde este hilo.
+        """
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
         try:
-            cursor = self.conn.cursor()
-            ciudad_filtro = self.combo_filtro_ciudad.get()
+            while True:
+                job = self._jobs.get()
+                if job is None:
+                    break
+                query, params, callback = job
+                try:
+                    rows = conn.execute(query, params).fetchall()
+                    self._results.put((callback, rows, None))
+                except Exception as e:
+                    # Cualquier error se entrega al callback; el hilo sigue vivo
+                    self._results.put((callback, None, e))
+        finally:
+            conn.close()
+
+    def _submit(self, query: str, params: tuple, callback):
+        """
+        Encola una consulta de solo lectura para el hilo de fondo.
 
-            query = """
-                SELECT
-                    c.nombre_ciudad,
-                    p.nombre_producto,
-                    i.stock_actual
-                FROM inventario i
-                JOIN productos p ON i.id_producto = p.id_producto
-                JOIN ciudades c ON i.id_ciudad = c.id_ciudad
-            """
+        Args:
+            query: Sentencia SQL a ejecutar
+            params: Parámetros de la sentencia
+            callback: Función (rows, error) que se ejecuta en el hilo de Tk
+        """
+        self._jobs.put((query, params, callback))
 
-            params = []
-            if ciudad_filtro and ciudad_filtro != "Todas":
-                query += " WHERE c.nombre_ciudad = ?"
-                params.append(ciudad_filtro)
+    def _drain(self):
+        """Entrega en el hilo de Tk los resultados del hilo de fondo."""
+        try:
+            while True:
+                try:
+                    callback, rows, error = self._results.get_nowait()
+                except queue.Empty:
+                    break
+                callback(rows, error)
+        finally:
+            # Reprogramar aunque un callback falle, para no detener la entrega
+            self.root.after(50, self._drain)
+
+    def actualizar_disponibilidad(self, recargar: bool = False):
+        """
+        Actualiza la tabla de disponibilidad de productos.
+
+        El inventario se consulta en segundo plano solo cuando la caché en
+        memoria fue invalidada (al iniciar, tras registrar un pedido o al
+        recargar); si no, se filtra directamente la caché.
 
-            query += " ORDER BY c.nombre_ciudad, p.nombre_producto"
+        Args:
+            recargar: Si es True, vuelve a consultar el inventario en la base de datos
+        """
+        if not self.conn:
+            return
 
-            cursor.execute(query, params)
+        if recargar:
+            self._inv_df = None
 
-            for row in cursor.fetchall():
-                ciudad, producto, stock = row
+        if self._inv_df is None:
+            self._submit(_Q_INV_FULL, (), self._on_inventario_cargado)
+        else:
+            self.llenar_disponibilidad()
 
-                # Determinar estado y tag
-                if stock < 10:
-                    estado = "🔴 BAJO"
-                    tag = "bajo"
-                elif stock < 20:
-                    estado = "🟡 MEDIO"
-                    tag = "medio"
-                else:
-                    estado = "🟢 OK"
-                    tag = "ok"
+    def _on_inventario_cargado(self, rows: Optional[List[tuple]], error):
+        """Guarda el inventario recibido del hilo de fondo y llena la tabla."""
+        if error is not None:
+            messagebox.showerror(
+                "Error", f"Error al actualizar disponibilidad: {error}"
+            )
+            return
 
-                self.tree_disponibilidad.insert(
-                    "", "end", values=(ciudad, producto, stock, estado), tags=(tag,)
-                )
+        self._inv_df = pd.DataFrame(
+            rows, columns=["nombre_ciudad", "nombre_producto", "stock_actual"]
+        )
+        self.llenar_disponibilidad()
+
+    def llenar_disponibilidad(self):
+        """Llena la tabla de disponibilidad desde el inventario en memoria."""
+        # Limpiar tabla (una sola llamada a Tcl)
+        self.tree_disponibilidad.delete(*self.tree_disponibilidad.get_children())
+
+        df = self._inv_df
+
+        # Filtrar por ciudad en memoria
+        ciudad_filtro = self.combo_filtro_ciudad.get()
+        if ciudad_filtro and ciudad_filtro != "Todas":
+            df = df[df["nombre_ciudad"] == ciudad_filtro]
+
+        # Determinar estado y tag de todas las filas a la vez
+        stocks = df["stock_actual"].to_numpy()
+        niveles = np.searchsorted(_STOCK_LIMITES, stocks, side="right")
+
+        for ciudad, producto, stock, estado, tag in zip(
+            df["nombre_ciudad"].tolist(),
+            df["nombre_producto"].tolist(),
+            stocks.tolist(),
+            _STOCK_ESTADOS[niveles].tolist(),
+            _STOCK_TAGS[niveles].tolist(),
+        ):
+            self.tree_disponibilidad.insert(
+                "", "end", values=(ciudad, producto, stock, estado), tags=(tag,)
+            )
 
-        except sqlite3.Error as e:
-            messagebox.showerror("Error", f"Error al actualizar disponibilidad: {e}")
+    def actualizar_alertas(self, avisar: bool = False):
+        """
+        Actualiza en segundo plano la tabla de alertas y la barra de estado.
 
-    def actualizar_alertas(self):
-        """Actualiza la tabla de alertas de stock bajo."""
-        # Limpiar tabla
-        for item in self.tree_alertas.get_children():
-            self.tree_alertas.delete(item)
+        Solo se carga la primera página de alertas; el resto se pide con el
+        botón "Cargar más".
 
+        Args:
+            avisar: Si es True, muestra un aviso cuando hay productos con stock bajo
+        """
         if not self.conn:
             return
 
-        try:
-            cursor = self.conn.cursor()
+        self._alerts_offset = 0
+        self.actualizar_estado_alertas(avisar)
+        self.cargar_mas_alertas()
 
-            cursor.execute("""
-                SELECT
-                    c.nombre_ciudad,
-                    p.nombre_producto,
-                    i.stock_actual,
-                    10 as stock_minimo,
-                    (10 - i.stock_actual) as faltante
-                FROM inventario i
-                JOIN productos p ON i.id_producto = p.id_producto
-                JOIN ciudades c ON i.id_ciudad = c.id_ciudad
-                WHERE i.stock_actual < 10
-                ORDER BY i.stock_actual ASC, c.nombre_ciudad
-            """)
+    def actualizar_estado_alertas(self, avisar: bool = False):
+        """
+        Cuenta en segundo plano las alertas y actualiza la barra de estado.
 
-            alertas_count = 0
-            for row in cursor.fetchall():
-                ciudad, producto, stock_actual, stock_minimo, faltante = row
-                self.tree_alertas.insert(
-                    "",
-                    "end",
-                    values=(ciudad, producto, stock_actual, stock_minimo, faltante),
-                    tags=("critico",),
-                )
-                alertas_count += 1
+        Args:
+            avisar: Si es True, muestra un aviso cuando hay productos con stock bajo
+        """
+        if not self.conn:
+            return
 
-            # Actualizar barra de estado
-            if alertas_count > 0:
-                self.status_bar.config(
-                    text=f"⚠️ {alertas_count} alerta(s) de stock bajo", foreground="red"
-                )
-            else:
-                self.status_bar.config(
-                    text="✅ No hay alertas de stock bajo", foreground="green"
-                )
+        self._submit(
+            _Q_ALERTS_COUNT,
+            (),
+            lambda rows, error: self._on_alertas_count(rows, error, avisar),
+        )
 
-        except sqlite3.Error as e:
-            messagebox.showerror("Error", f"Error al actualizar alertas: {e}")
+    def cargar_mas_alertas(self):
+        """Pide en segundo plano la siguiente página de alertas."""
+        offset = self._alerts_offset
+        self._submit(
+            _Q_ALERTS_PAGE,
+            (_ALERTS_PAGE_SIZE, offset),
+            lambda rows, error: self._on_alertas_page(rows, error, offset),
+        )
 
-    def check_stock_alerts(self):
-        """Verifica y muestra alertas de stock al iniciar la aplicación."""
-        if not self.conn:
+    def _on_alertas_count(self, rows: Optional[List[tuple]], error, avisar: bool):
+        """Actualiza la barra de estado con el total de alertas."""
+        if error is not None:
+            messagebox.showerror("Error", f"Error al actualizar alertas: {error}")
             return
 
-        try:
-            cursor = self.conn.cursor()
+        self._low_stock_count = rows[0][0]
+        self.mostrar_estado_alertas()
 
-            cursor.execute("""
-                SELECT COUNT(*)
-                FROM inventario
-                WHERE stock_actual < 10
-            """)
+        if avisar and self._low_stock_count > 0:
+            messagebox.showwarning(
+                "Alertas de Stock",
+                f"⚠️ Hay {self._low_stock_count} producto(s) con stock bajo.\n\n"
+                f"Revisa la pestaña 'Alertas de Stock' para más detalles.",
+            )
 
-            count = cursor.fetchone()[0]
+    def mostrar_estado_alertas(self):
+        """Muestra en la barra de estado el total de alertas en memoria."""
+        if self._low_stock_count:
+            self.status_bar.config(
+                text=f"⚠️ {self._low_stock_count} alerta(s) de stock bajo",
+                foreground="red",
+            )
+        else:
+            self.status_bar.config(
+                text="✅ No hay alertas de stock bajo", foreground="green"
+            )
 
-            if count > 0:
-                messagebox.showwarning(
-                    "Alertas de Stock",
-                    f"⚠️ Hay {count} producto(s) con stock bajo.\n\n"
-                    f"Revisa la pestaña 'Alertas de Stock' para más detalles.",
-                )
+    def _on_alertas_page(self, rows: Optional[List[tuple]], error, offset: int):
+        """Agrega a la tabla de alertas una página recibida del hilo de fondo."""
+        if error is not None:
+            messagebox.showerror("Error", f"Error al actualizar alertas: {error}")
+            return
 
-        except sqlite3.Error as e:
-            print(f"Error al verificar alertas: {e}")
+        # Descartar páginas pedidas antes de una actualización posterior
+        if offset != self._alerts_offset:
+            return
+
+        # La primera página reemplaza el contenido (una sola llamada a Tcl)
+        if offset == 0:
+            self.tree_alertas.delete(*self.tree_alertas.get_children())
+
+        for ciudad, producto, stock_actual, stock_minimo, faltante in rows:
+            self.tree_alertas.insert(
+                "",
+                "end",
+                values=(ciudad, producto, stock_actual, stock_minimo, faltante),
+                tags=("critico",),
+            )
+
+        self._alerts_offset = offset + len(rows)
+        self.btn_cargar_mas.config(
+            state="normal"
+            if self._alerts_offset < (self._low_stock_count or 0)
+            else "disabled"
+        )
 
     def __del__(self):
         """Cierra la conexión a la base de datos al cerrar la aplicación."""
+        self._jobs.put(None)
         if self.conn:
             self.conn.close()
 